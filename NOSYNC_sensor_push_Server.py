@@ -1,11 +1,13 @@
 import pyodbc
-import time
+import asyncio
+import signal
 import logging
 import pandas as pd
+import numpy as np
 import courier # notification api that will link with twilio 
+import httpx
 import os
 
-from warnings import filterwarnings
 from dotenv import load_dotenv
 
 
@@ -13,230 +15,335 @@ from dotenv import load_dotenv
 # Adding the column "operational" to the SQL table will prevent the moving of all of the rows from table to table. 
 # Currently, since every sensor is "offline" they are all moved into the offline_sensors table as its based on soley
 # time since last heartbeat.
-# Version without asyncio because asyncio is not the best, could still switch back to using an event loop
+# Sweeps are scheduled on an asyncio event loop, the blocking database work runs in an executor thread
 # todo: add cleanup in event of closure during sweeping, server should fix its self however 
+# The heartbeat filters are written as ranges on last_heartbeat so the indexes in sql/indexes.sql are used
 ###
 
 
-# pyodbc works fine with pandas, ignoring warning 
-filterwarnings("ignore", category=UserWarning, message='.*pandas only supports SQLAlchemy connectable.*')
+# Load environment variables from .env file once, a missing variable raises KeyError at import
+load_dotenv()
+
+# Connection string is built once and shared by every connection
+_CONN_STR = (
+    f"DRIVER={os.environ['DRIVER']};"
+    f"SERVER={os.environ['DB_HOST']};"
+    f"DATABASE={os.environ['DB_DATABASE']};"
+    f"UID={os.environ['DB_USERNAME']};"
+    f"PWD={os.environ['DB_PASSWORD']};"
+    "charset=utf8mb4;"
+    "MULTI_STATEMENTS=1;"  # lets the sweep run as a single batch
+)
+
+# Notification intervals, in the order of the sweep's bucket labels; the counter column for a due sensor
+# is looked up by indexing these with the bucket code (30m has no secondary notification)
+_BUCKETS = np.array(['30m', '1hr', '3hr', '6hr', '12hr', 'daily', 'weekly'], dtype=object)
+_PRIMARY_KEYS = np.array([
+    'notify_30m_primary', 'notify_1hr_primary', 'notify_3hr_primary', 'notify_6hr_primary',
+    'notify_12hr_primary', 'notify_daily_primary', 'notify_weekly_primary'
+], dtype=object)
+_SECONDARY_KEYS = np.array([
+    None, 'notify_1hr_secondary', 'notify_3hr_secondary', 'notify_6hr_secondary',
+    'notify_12hr_secondary', 'notify_daily_secondary', 'notify_weekly_secondary'
+], dtype=object)
 
 class SensorMonitor:
     def __init__(self):
         # Setup logging
         logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
 
-        # Load environment variables from .env file
-        load_dotenv()
-
         # Enable connection pooling to alleviate overhead on the db
         pyodbc.pooling = True
 
-        # Create connection string
-        self.connection_string = (
-            f"DRIVER={os.getenv('DRIVER')};"
-            f"SERVER={os.getenv('DB_HOST')};"
-            f"DATABASE={os.getenv('DB_DATABASE')};"
-            f"UID={os.getenv('DB_USERNAME')};"
-            f"PWD={os.getenv('DB_PASSWORD')};"
-            f"charset={'utf8mb4'};"
-        )
+        self.connection_string = _CONN_STR
+
+        # Server time of the last committed sweep, bounds the next INSERT to sensors that went quiet since
+        self._last_sweep = None
+
+        # One long-lived connection reused by every sweep, opened by the first ensure_connection so a database
+        # that is down at start-up is retried every cycle instead of crashing the process
+        self.conn = None
 
-    def del_offline_sensors(self):
-        """Function to delete sensors from the offline_sensors table that are back online"""
+    def connect(self):
+        """Function to (re)open the long-lived database connection"""
+        self.conn = pyodbc.connect(self.connection_string, autocommit=False, timeout=10)
+        logging.info("Successfully connected to the database.")
+
+    def disconnect(self):
+        """Function to close the long-lived database connection"""
+        if self.conn is None:
+            return
         try:
-            with pyodbc.connect(self.connection_string, timeout=10) as conn:
-                cursor = conn.cursor()
-                
-                # SQL query to delete entries when sensors are back online
-                sql = """
-                DELETE os
-                FROM offline_sensors os
-                JOIN sources s ON os.id_in_sources = s.id AND os.master_id = s.master_id
-                WHERE TIMESTAMPDIFF(MINUTE, s.last_heartbeat, NOW()) < 30
-                """
-                # todo: above needs to be switched to "< 30" not ""> 3000", this is just for testing
-
-                cursor.execute(sql)
-                rows_deleted = cursor.rowcount
-                conn.commit()  
-                logging.info(f"{rows_deleted} entries deleted from offline_sensors based on sources data (sensor online).")
-    
-        except pyodbc.Error as e:
-            logging.error(f"An error occurred while trying to delete sensor data: {e}")
+            self.conn.close()
+        except pyodbc.Error:
+            pass  # connection is already dead, any open transaction is rolled back server side
+        self.conn = None
 
-    def add_offline_sensors_to_table(self):
-        """Function to add/update sensors from the table that have undetected heartbeats"""
+    def reconnect(self):
+        """Function to drop the current connection and open a fresh one"""
+        self.disconnect()
         try:
-            with pyodbc.connect(self.connection_string, timeout=10) as conn:
-                cursor = conn.cursor()
-                
-                # SQL query to join and update/insert data
-                sql = """
-                INSERT INTO offline_sensors (id_in_sources, service, master_id, master_name, last_heartbeat, minutes_since_last_heartbeat)
-                SELECT s.id, s.service, s.master_id, s.master_name, s.last_heartbeat,
-                    TIMESTAMPDIFF(MINUTE, s.last_heartbeat, NOW()) AS minutes_since_last_heartbeat
-                FROM sources s
-                WHERE TIMESTAMPDIFF(MINUTE, s.last_heartbeat, NOW()) > 30
-                AND s.master_id IS NOT NULL
-                ON DUPLICATE KEY UPDATE
-                    service = VALUES(service),
-                    master_id = VALUES(master_id),
-                    master_name = VALUES(master_name),
-                    last_heartbeat = VALUES(last_heartbeat),
-                    minutes_since_last_heartbeat = VALUES(minutes_since_last_heartbeat);
-                """
-                
-                cursor.execute(sql)
-                conn.commit() 
-                logging.info("Successfully updated offline_sensors table from sources.")
-    
+            self.connect()
         except pyodbc.Error as e:
-            logging.error(f"An error occurred while updating the database: {e}")
+            logging.error(f"An error occurred while reconnecting to the database: {e}")
 
-    def update_offline_sensors(self, df):
-        """Update the offline_sensors table using direct SQL execution (caution: risk of SQL injection)."""
+    def ensure_connection(self):
+        """Function to check the connection is alive with a cheap query, reconnecting if it is not"""
+        if self.conn is None:
+            self.connect()
+            return
         try:
-            with pyodbc.connect(self.connection_string, timeout=10) as conn:
-                conn.autocommit = False
-                cursor = conn.cursor()
-                for index, row in df.iterrows():
-                    # SQL Injection is very possible here, since this is an internal tool however, this should be okay
-                    # This is due to the sql driver not supporting batch updates
-                    sql = f"""
-                    UPDATE offline_sensors
-                    SET 
-                        notify_30m_primary = {int(row['notify_30m_primary'])},
-                        notify_1hr_primary = {int(row['notify_1hr_primary'])},
-                        notify_3hr_primary = {int(row['notify_3hr_primary'])},
-                        notify_6hr_primary = {int(row['notify_6hr_primary'])},
-                        notify_12hr_primary = {int(row['notify_12hr_primary'])},
-                        notify_daily_primary = {int(row['notify_daily_primary'])},
-                        notify_weekly_primary = {int(row['notify_weekly_primary'])},
-                        notify_1hr_secondary = {int(row['notify_1hr_secondary'])},
-                        notify_3hr_secondary = {int(row['notify_3hr_secondary'])},
-                        notify_6hr_secondary = {int(row['notify_6hr_secondary'])},
-                        notify_12hr_secondary = {int(row['notify_12hr_secondary'])},
-                        notify_daily_secondary = {int(row['notify_daily_secondary'])},
-                        notify_weekly_secondary = {int(row['notify_weekly_secondary'])}
-                    WHERE id_in_sources = {int(row['id_in_sources'])} AND master_id = '{row['master_id']}';
-                    """
-                    cursor.execute(sql)
-                conn.commit()
-                logging.info("Successfully updated offline_sensors table from DataFrame.")
+            self.conn.cursor().execute("SELECT 1").fetchone()
         except pyodbc.Error as e:
-            conn.rollback()
-            print(f"An error occurred during batch update: {e}")
-
-    def check_and_notify(self, df):
-        """Notifies stakeholders and updates table"""
-        intervals = [
-            (30, 60, 'notify_30m_primary', None),
-            (60, 180, 'notify_1hr_primary', 'notify_1hr_secondary'),
-            (180, 360, 'notify_3hr_primary', 'notify_3hr_secondary'),
-            (360, 720, 'notify_6hr_primary', 'notify_6hr_secondary'),
-            (720, 1440, 'notify_12hr_primary', 'notify_12hr_secondary'),
-            (1440, 10080, 'notify_daily_primary', 'notify_daily_secondary'),
-            (10080, float('inf'), 'notify_weekly_primary', 'notify_weekly_secondary')
-        ]
-        
-        for start, end, primary_key, secondary_key in intervals:
-            mask = (df['minutes_since_last_heartbeat'] > start) & (df['minutes_since_last_heartbeat'] <= end)
-            
-            for key in [primary_key, secondary_key]:
-                if key:
-                    if key.startswith('notify_daily'):
-                        # Calculate the minimum minutes required for the next notification
-                        min_minutes_for_next = 1440 * (df[key] + 1)
-                        notify_mask = mask & (df[key] < 7) & (df['minutes_since_last_heartbeat'] >= min_minutes_for_next)
-                    elif key.startswith('notify_weekly'):
-                        # Calculate the minimum minutes required for the next notification
-                        min_minutes_for_next = 10080 * (df[key] + 1)
-                        notify_mask = mask & (df['minutes_since_last_heartbeat'] >= min_minutes_for_next)
-                    else:
-                        notify_mask = mask & (df[key] == 0)
-                    
-                    df.loc[notify_mask, key] += 1  # Increment the notification counter
-                    for index in notify_mask[notify_mask].index:
-                        sensor_id = df.at[index, 'id_in_sources']
-                        logging.info(f"Notification sent for {key}: ID {sensor_id} at {df.at[index, 'last_heartbeat']}")
-                        
-                        # Send SMS and email notifications
-                        self.send_sms(sensor_id)
-                        self.send_email(sensor_id)
+            logging.warning(f"Database connection lost, reconnecting: {e}")
+            self.reconnect()
+
+    def has_offline_sensors(self, cursor):
+        """Cheap check for whether a sweep has anything to do: a sensor past the 30 minute mark in sources
+        or a sensor still tracked in offline_sensors"""
+        sql = """
+        SELECT EXISTS (
+            SELECT 1
+            FROM sources s
+            WHERE s.last_heartbeat <= @now - INTERVAL 31 MINUTE  -- more than 30 whole minutes, sargable
+            AND s.master_id IS NOT NULL
+        ) OR EXISTS (
+            SELECT 1
+            FROM offline_sensors
+        );
+        """
+        return bool(cursor.execute(sql).fetchval())
+
+    def sweep_offline_sensors(self, cursor):
+        """Add sensors whose heartbeat crossed the 30 minute mark since the last sweep, delete sensors that are
+        back online, refresh minutes_since_last_heartbeat, increment the counters of the offline sensors that are
+        due a notification and pull those sensors, all as one multi-statement batch (single round trip)"""
+        sql = """
+        INSERT INTO offline_sensors (id_in_sources, service, master_id, master_name, last_heartbeat, minutes_since_last_heartbeat)
+        SELECT s.id, s.service, s.master_id, s.master_name, s.last_heartbeat,
+            TIMESTAMPDIFF(MINUTE, s.last_heartbeat, @now) AS minutes_since_last_heartbeat
+        FROM sources s
+        WHERE s.last_heartbeat <= @now - INTERVAL 31 MINUTE  -- more than 30 whole minutes, sargable
+        AND s.last_heartbeat > @prev - INTERVAL 31 MINUTE  -- older ones were added by an earlier sweep
+        AND s.master_id IS NOT NULL
+        ON DUPLICATE KEY UPDATE
+            service = VALUES(service),
+            master_id = VALUES(master_id),
+            master_name = VALUES(master_name),
+            last_heartbeat = VALUES(last_heartbeat),
+            minutes_since_last_heartbeat = VALUES(minutes_since_last_heartbeat);
+
+        DELETE os
+        FROM offline_sensors os
+        JOIN sources s ON os.id_in_sources = s.id AND os.master_id = s.master_id
+        WHERE s.last_heartbeat > @now - INTERVAL 30 MINUTE;  -- under 30 whole minutes, sargable
+
+        UPDATE offline_sensors
+        SET minutes_since_last_heartbeat = TIMESTAMPDIFF(MINUTE, last_heartbeat, @now);
+
+        DROP TEMPORARY TABLE IF EXISTS due_sensors;
+
+        CREATE TEMPORARY TABLE due_sensors
+        WITH b AS (
+            SELECT id_in_sources, master_id, last_heartbeat, minutes_since_last_heartbeat,
+                notify_30m_primary, notify_1hr_primary, notify_3hr_primary, notify_6hr_primary, notify_12hr_primary, 
+                notify_daily_primary, notify_weekly_primary, notify_1hr_secondary, notify_3hr_secondary, 
+                notify_6hr_secondary, notify_12hr_secondary, notify_daily_secondary, notify_weekly_secondary,
+                CASE
+                    WHEN minutes_since_last_heartbeat <= 30 THEN NULL
+                    WHEN minutes_since_last_heartbeat <= 60 THEN '30m'
+                    WHEN minutes_since_last_heartbeat <= 180 THEN '1hr'
+                    WHEN minutes_since_last_heartbeat <= 360 THEN '3hr'
+                    WHEN minutes_since_last_heartbeat <= 720 THEN '6hr'
+                    WHEN minutes_since_last_heartbeat <= 1440 THEN '12hr'
+                    WHEN minutes_since_last_heartbeat <= 10080 THEN 'daily'
+                    ELSE 'weekly'
+                END AS bucket
+            FROM offline_sensors
+        ), d AS (
+            SELECT id_in_sources, master_id, last_heartbeat, minutes_since_last_heartbeat, bucket,
+                CASE bucket
+                    WHEN '30m' THEN notify_30m_primary = 0
+                    WHEN '1hr' THEN notify_1hr_primary = 0
+                    WHEN '3hr' THEN notify_3hr_primary = 0
+                    WHEN '6hr' THEN notify_6hr_primary = 0
+                    WHEN '12hr' THEN notify_12hr_primary = 0
+                    WHEN 'daily' THEN notify_daily_primary < 7
+                        AND minutes_since_last_heartbeat >= 1440 * (notify_daily_primary + 1)
+                    WHEN 'weekly' THEN minutes_since_last_heartbeat >= 10080 * (notify_weekly_primary + 1)
+                    ELSE 0
+                END AS primary_due,
+                CASE bucket
+                    WHEN '1hr' THEN notify_1hr_secondary = 0
+                    WHEN '3hr' THEN notify_3hr_secondary = 0
+                    WHEN '6hr' THEN notify_6hr_secondary = 0
+                    WHEN '12hr' THEN notify_12hr_secondary = 0
+                    WHEN 'daily' THEN notify_daily_secondary < 7
+                        AND minutes_since_last_heartbeat >= 1440 * (notify_daily_secondary + 1)
+                    WHEN 'weekly' THEN minutes_since_last_heartbeat >= 10080 * (notify_weekly_secondary + 1)
+                    ELSE 0
+                END AS secondary_due
+            FROM b
+        )
+        SELECT id_in_sources, master_id, last_heartbeat, minutes_since_last_heartbeat, bucket, primary_due, secondary_due
+        FROM d
+        WHERE primary_due OR secondary_due;
+
+        UPDATE offline_sensors o
+        JOIN due_sensors d ON o.id_in_sources = d.id_in_sources AND o.master_id = d.master_id
+        SET
+            o.notify_30m_primary = o.notify_30m_primary + (d.bucket = '30m' AND d.primary_due),
+            o.notify_1hr_primary = o.notify_1hr_primary + (d.bucket = '1hr' AND d.primary_due),
+            o.notify_3hr_primary = o.notify_3hr_primary + (d.bucket = '3hr' AND d.primary_due),
+            o.notify_6hr_primary = o.notify_6hr_primary + (d.bucket = '6hr' AND d.primary_due),
+            o.notify_12hr_primary = o.notify_12hr_primary + (d.bucket = '12hr' AND d.primary_due),
+            o.notify_daily_primary = o.notify_daily_primary + (d.bucket = 'daily' AND d.primary_due),
+            o.notify_weekly_primary = o.notify_weekly_primary + (d.bucket = 'weekly' AND d.primary_due),
+            o.notify_1hr_secondary = o.notify_1hr_secondary + (d.bucket = '1hr' AND d.secondary_due),
+            o.notify_3hr_secondary = o.notify_3hr_secondary + (d.bucket = '3hr' AND d.secondary_due),
+            o.notify_6hr_secondary = o.notify_6hr_secondary + (d.bucket = '6hr' AND d.secondary_due),
+            o.notify_12hr_secondary = o.notify_12hr_secondary + (d.bucket = '12hr' AND d.secondary_due),
+            o.notify_daily_secondary = o.notify_daily_secondary + (d.bucket = 'daily' AND d.secondary_due),
+            o.notify_weekly_secondary = o.notify_weekly_secondary + (d.bucket = 'weekly' AND d.secondary_due);
+
+        SELECT id_in_sources, master_id, last_heartbeat, bucket, primary_due, secondary_due
+        FROM due_sensors;
+        """
+        cursor.execute(sql)
+        logging.info("Successfully updated offline_sensors table from sources.")
+
+        # Step through the result of each statement in the batch
+        cursor.nextset()
+        logging.info(f"{cursor.rowcount} entries deleted from offline_sensors based on sources data (sensor online).")
+
+        # Skip past the temp table and counter UPDATE results to the due_sensors rows
+        while cursor.nextset() and cursor.description is None:
+            pass
+        columns = [column[0] for column in cursor.description]
+        # Narrow dtypes: the flags are 0/1 and the bucket is one of the interval labels; ids stay 64 bit since a
+        # narrowing astype would silently wrap large source ids
+        df = pd.DataFrame.from_records([tuple(row) for row in cursor.fetchall()], columns=columns).astype({
+            'id_in_sources': 'int64',
+            'bucket': pd.CategoricalDtype(_BUCKETS),
+            'primary_due': 'int8',
+            'secondary_due': 'int8',
+        })
+        logging.info(f"Successfully pulled {len(df)} sensors due a notification from offline_sensors.")
         return df
 
+    async def check_and_notify(self, df):
+        """Notifies stakeholders of the sensors the sweep marked as due"""
+        # Pull the columns once; the notification lookups work on these arrays
+        codes = df['bucket'].cat.codes.to_numpy()
+        ids = df['id_in_sources'].to_numpy()
+        heartbeats = df['last_heartbeat'].to_numpy(dtype=object)  # pandas Timestamps, keeps the log format
+        primary_due = df['primary_due'].to_numpy() == 1
+        secondary_due = df['secondary_due'].to_numpy() == 1
+
+        coros = []
+        for keys, due in [(_PRIMARY_KEYS, primary_due), (_SECONDARY_KEYS, secondary_due)]:
+            idx = np.flatnonzero(due & (codes >= 0))
+            for key, sensor_id, heartbeat in zip(keys[codes[idx]], ids[idx], heartbeats[idx]):
+                if key:
+                    coros.append(self._dispatch(sensor_id, key, heartbeat))
+
+        for result in await asyncio.gather(*coros, return_exceptions=True):
+            if isinstance(result, Exception):
+                logging.error(f"An error occurred while sending a notification: {result}")
+
+    async def _dispatch(self, sensor_id, key, heartbeat):
+        """Send SMS and email notifications for one due sensor"""
+        await asyncio.gather(self.send_sms(sensor_id), self.send_email(sensor_id))
+        logging.info(f"Notification sent for {key}: ID {sensor_id} at {heartbeat}")
+
     def who_to_send_to(self):
+        """Sweeps offline_sensors and returns the sensors that are due a notification"""
         try:
-            with pyodbc.connect(self.connection_string, timeout=10) as conn:
-                cursor = conn.cursor()
-                sql = """
-                SELECT id_in_sources, service, master_id, master_name, last_heartbeat, minutes_since_last_heartbeat,
-                    notify_30m_primary, notify_1hr_primary, notify_3hr_primary, notify_6hr_primary, notify_12hr_primary, 
-                    notify_daily_primary, notify_weekly_primary, notify_1hr_secondary, notify_3hr_secondary, 
-                    notify_6hr_secondary, notify_12hr_secondary, notify_daily_secondary, notify_weekly_secondary 
-                FROM offline_sensors;
-                """
-                logging.info("Successfully pulled from offline_sensors.")
-                df = pd.read_sql(sql, conn)
-                
-                # Notify respected parties and get updated DataFrame
-                updated_df = self.check_and_notify(df)
-                
-                # Update the offline_sensors table with the updated DataFrame
-                self.update_offline_sensors(updated_df)
+            cursor = self.conn.cursor()
 
-        except pyodbc.Error as e:
-            logging.error(f"An error occurred while pulling from the database: {e}")
+            # One timestamp for every statement in this sweep, so the INSERT and DELETE agree on who is offline,
+            # and the previous sweep's timestamp (the whole table is scanned on the first sweep). Set and read back
+            # in one statement; the CAST hands back a datetime rather than the variable's binary string form
+            now = cursor.execute(
+                "SELECT CAST(@now := NOW() AS DATETIME), @prev := CAST(COALESCE(?, '1970-01-01') AS DATETIME);",
+                self._last_sweep,
+            ).fetchval()
+            if not self.has_offline_sensors(cursor):
+                # Nothing to insert, delete or notify; end the read transaction so the next check sees fresh data
+                self.conn.rollback()
+                logging.info("No offline sensors, skipping the sweep.")
+                return None
 
+            df = self.sweep_offline_sensors(cursor)
+            self.conn.commit()
+            self._last_sweep = now
+            return df
 
-    def send_sms(self, id):
+        except Exception as e:
+            # Drop the connection so a half-finished sweep's transaction is rolled back, not committed by the next one
+            logging.error(f"An error occurred during the offline_sensors sweep: {e}")
+            self.reconnect()
+            return None
+
+
+    async def send_sms(self, id):
         """Function to send sms messages via api call"""
-        # Search users table with id (can send in another identifer) and call api
+        # Search users table with id (can send in another identifer) and call api through self._http
         # Can not figure out what the link is between sensors in sources and their respected parties to notify.
         # is it master id? 
         pass
         
-    def send_email(self, id):
+    async def send_email(self, id):
         """Function to send email messages via api/smpt server call"""
-        # Search users table with id (can send in another identifer) and call api
+        # Search users table with id (can send in another identifer) and call api through self._http
         pass
     
     def connect_and_execute(self):
-        """Function to connect to the database and execute queries."""
+        """Function to check the database connection and execute queries, returns the sensors to notify."""
         try:
-            with pyodbc.connect(self.connection_string, timeout=10) as conn:
-                logging.info("Successfully connected to the database.")
+            self.ensure_connection()
 
-                # add offline sensors to db
-                self.add_offline_sensors_to_table() ## 1st sql call
-
-                # remove online sensors from db
-                self.del_offline_sensors() ## 2nd sql call
-
-                # this is where we notify the stakeholders bassed off offline_sensors db
-                self.who_to_send_to() ## 3rd, 4th, and 5th sql call
+            # add/remove offline sensors and pick out who to notify over the long-lived connection
+            return self.who_to_send_to() ## timestamps, idle check, one sweep batch and the commit
                 
         except Exception as e:
             logging.error("An error occurred while connecting to the database: %s", e)
+            return None
             
-    def main_loop(self):
-        """Main loop to run tasks every 5 minutes."""
-        try:
-            while True:
-                logging.info("Starting the database operation...")
-                self.connect_and_execute()
-                logging.info("Waiting for the next cycle...")
-                time.sleep(300)  # 5 minute sweep interval
-        except KeyboardInterrupt:
-            logging.info("Shutdown signal received. Exiting...")
-
-            # close msg servers
-        except Exception as e:
-            logging.error("An unexpected error occurred: %s", e)
+    async def run(self):
+        """Main loop to run tasks every 5 minutes, stopping cleanly on SIGINT/SIGTERM."""
+        loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stop.set)
+
+        # Shared keep-alive client so the sms/email api calls for a sweep go out concurrently, closed on every exit
+        async with httpx.AsyncClient(timeout=10, limits=httpx.Limits(max_keepalive_connections=32)) as self._http:
+            try:
+                while not self._stop.is_set():
+                    logging.info("Starting the database operation...")
+                    started = loop.time()
+                    df = await loop.run_in_executor(None, self.connect_and_execute)
+
+                    # Notify respected parties once the sweep is committed, the counters were already incremented by it
+                    if df is not None and not df.empty:
+                        await self.check_and_notify(df)
+
+                    # Sleep out the rest of the 5 minute sweep interval, waking early on shutdown
+                    logging.info("Waiting for the next cycle...")
+                    try:
+                        await asyncio.wait_for(self._stop.wait(), timeout=max(0, 300 - (loop.time() - started)))
+                    except asyncio.TimeoutError:
+                        pass
+                logging.info("Shutdown signal received. Exiting...")
+
+            except Exception as e:
+                logging.error("An unexpected error occurred: %s", e)
 
-            # close msg servers
+            finally:
+                # close msg servers
+                self.disconnect()
 
 if __name__ == "__main__":
     monitor = SensorMonitor()
-    monitor.main_loop()
+    asyncio.run(monitor.run())
@@ -0,0 +1,10 @@
+-- Indexes backing the offline sensor sweep in NOSYNC_sensor_push_Server.py
+-- Run once against the sensor database.
+
+-- Range seeks for the heartbeat cutoffs on sources (INSERT ... SELECT and the idle check). last_heartbeat leads
+-- because the only master_id filter is IS NOT NULL, itself a range, and MySQL stops seeking at the first range
+-- key part; master_id is kept second so that filter is still checked from the index
+CREATE INDEX idx_sources_lh_mid ON sources (last_heartbeat, master_id);
+
+-- Join from offline_sensors back to sources and from due_sensors into offline_sensors
+CREATE INDEX idx_offsen_src ON offline_sensors (id_in_sources, master_id);